@@ -4,9 +4,12 @@ import anime_manager.filesystem
 import anime_manager.library
 import anime_manager.torrents
 
+import atexit
+import hashlib
 import logging
+import logging.handlers
 import os
-import pathlib
+import queue
 import sys
 import time
 import verboselogs
@@ -18,6 +21,17 @@ import yaml
 
 log = verboselogs.VerboseLogger( __name__ )
 
+# The libyaml-based loaders & dumper are much faster, but are only available if
+# PyYAML was built with libyaml
+database_loader = getattr( yaml, "CSafeLoader", yaml.SafeLoader )
+cache_loader    = getattr( yaml, "CFullLoader", yaml.FullLoader )
+cache_dumper    = getattr( yaml, "CDumper"    , yaml.Dumper     )
+
+# Seconds after a daemon update during which further events for an unchanged
+# database are treated as part of the same save & skipped; any later event
+# (e.g. touching the database) always runs a full update
+save_event_window = 5
+
 
 def configure_logging( args ):
     """Configure logging based on command-line arguments
@@ -26,43 +40,85 @@ def configure_logging( args ):
         args (iterable):    Command-line arguments (see `arguments` submodule)
     """
     
+    file_handler = logging.FileHandler(
+        args.log_file if args.log_file is not None
+        else args.cache_dir / "log"
+    )
+    file_handler.setFormatter( logging.Formatter(
+        "[%(levelname)s][%(name)s][%(asctime)s] %(message)s"
+    ) )
+    
+    # Records are only queued by the threads logging them, while a background
+    # thread formats them & does the actual writes to the log file
+    log_queue = queue.SimpleQueue()
+    listener  = logging.handlers.QueueListener( log_queue, file_handler )
+    listener.start()
+    atexit.register( listener.stop )
+    
+    # The queue handler pre-formats each record's message before queueing it,
+    # so leave the full format to the file handler
+    queue_handler = logging.handlers.QueueHandler( log_queue )
+    queue_handler.setFormatter( logging.Formatter( "%(message)s" ) )
+    
     logging.basicConfig(
-        filename = (
-            args.log_file if args.log_file is not None
-            else args.cache_dir / "log"
-        ),
-        level  = getattr( logging, args.log_level ),
-        format = "[%(levelname)s][%(name)s][%(asctime)s] %(message)s"
+        handlers = ( queue_handler, ),
+        level    = getattr( logging, args.log_level )
     )
 
 
-def reload_database( args ):
+def reload_database( args, fingerprint = None, cache = None ):
     """Run a single database update
     
     Args:
         args (argparse.Namespace):  Command-line arguments (see `arguments`
                                     submodule)
+        fingerprint (str|None):     Fingerprint of a database that was just
+                                    successfully applied; if the database is
+                                    unchanged, the update is skipped
+        cache (dict|None):          Flat database cache left by the previous
+                                    update in this process, if any; otherwise
+                                    it is loaded from the cache directory
+    
+    Returns:
+        tuple:  The fingerprint of the loaded database & the updated flat
+                database cache
     """
     
+    # Read the raw database first so an unchanged database can be skipped
+    # before anything else is loaded
+    with open( args.database, "rb" ) as db_file:
+        db_content = db_file.read()
+    new_fingerprint = hashlib.sha1( db_content ).hexdigest()
+    
+    if new_fingerprint == fingerprint:
+        log.info( "database unchanged, skipping update" )
+        return new_fingerprint, cache
+    
     args.cache_dir.mkdir( parents = True, exist_ok = True )
     
     cache_db = args.cache_dir / "flatdb_cache.yaml"
     
-    server = anime_manager.torrents.TransmissionServer( args.transmission )
+    server = anime_manager.torrents.TransmissionServer(
+        args.transmission,
+        args.cache_dir / "transmission_session_id"
+    )
     
-    # Load cached flat database
-    try:
-        with open( cache_db, encoding = "utf8" ) as cache_file:
-            cache = yaml.full_load( cache_file )
-            anime_manager.database.normalize_flatdb( server, cache )
-            log.info( "loaded flat database cache" )
-    except IOError:
-        cache = anime_manager.database.empty_flatdb()
-        log.info( "no flat database cache, creating" )
+    # Load cached flat database, unless it's still in memory from the last
+    # update; it's saved after every update, so the two are the same
+    if cache is None:
+        try:
+            with open( cache_db, encoding = "utf8" ) as cache_file:
+                cache = yaml.load( cache_file, Loader = cache_loader )
+                anime_manager.database.normalize_flatdb( server, cache )
+                log.info( "loaded flat database cache" )
+        except IOError:
+            cache = anime_manager.database.empty_flatdb()
+            log.info( "no flat database cache, creating" )
     
     # Load new database
-    with open( args.database, encoding = "utf8" ) as db_file:
-        db = anime_manager.database.normalize( yaml.full_load( db_file ) )
+    db = anime_manager.database.normalize(
+        yaml.load( db_content, Loader = database_loader )
+    )
     
     exception = None
     
@@ -73,7 +129,8 @@ def reload_database( args ):
             cache,
             db,
             None if args.no_trash else db[ "directories" ][ "trash" ],
-            args.dry_run
+            args.dry_run,
+            args.jobs
         )
         anime_manager.filesystem.cleanup_empty_dirs(
             db[ "directories" ],
@@ -83,21 +140,43 @@ def reload_database( args ):
         exception = e
     
     
-    # Save new database as cache
+    # Save new database as cache; written to a temporary file first so an
+    # interrupted save never leaves a truncated cache behind
     if not args.dry_run:
-        with open( cache_db, "w" ) as cache_file:
-            yaml.dump( cache, cache_file )
-            log.success( "saved new flat database cache" )
+        temp_cache_db = cache_db.with_name( "{}.{}".format(
+            cache_db.name,
+            anime_manager.filesystem.unique_name()
+        ) )
+        try:
+            with open( temp_cache_db, "w", encoding = "utf8" ) as cache_file:
+                yaml.dump( cache, cache_file, Dumper = cache_dumper )
+            os.replace( temp_cache_db, cache_db )
+        except:
+            # Don't leave a partial cache behind, but the save still failed
+            try:
+                os.unlink( temp_cache_db )
+            except FileNotFoundError:
+                pass
+            raise
+        log.success( "saved new flat database cache" )
     
     # Finally, re-raise any exceptions thrown by update:
     if exception is not None:
         raise exception
+    
+    return new_fingerprint, cache
 
 
 class AutoManageTorrentsHandler( watchdog.events.FileSystemEventHandler ):
     
     def __init__( self, args ):
         self.args = args
+        self.fingerprint = None
+        self.cache       = None
+        self.reloaded    = None
+        # Compared as a string, as every event in the database's directory is
+        # checked against it
+        self.database = os.fspath( args.database )
         log.info( "checking database" )
         self.reload()
         if self.args.dry_run:
@@ -105,26 +184,59 @@ class AutoManageTorrentsHandler( watchdog.events.FileSystemEventHandler ):
         watchdog.events.FileSystemEventHandler.__init__( self )
     
     def on_any_event( self, event ):
-        is_watched_file = pathlib.Path( event.src_path ) == self.args.database
+        # The database itself is never a directory, so don't bother with the
+        # directory's own modification events
+        if event.is_directory:
+            return
         
-        ( log.verbose if is_watched_file else log.debug )(
-            "got filesystem event: {!r}".format( event )
-        )
+        if event.event_type == watchdog.events.EVENT_TYPE_MOVED:
+            # Editors often save by moving a new file over the old one
+            path = event.dest_path
+        else:
+            path = event.src_path
+        is_watched_file = path == self.database
+        
+        # Events for every file in the database's directory end up here, so
+        # only format them if they will actually be logged
+        level = verboselogs.VERBOSE if is_watched_file else logging.DEBUG
+        if log.isEnabledFor( level ):
+            log.log( level, "got filesystem event: {!r}".format( event ) )
         
         if is_watched_file and event.event_type in (
             watchdog.events.EVENT_TYPE_CREATED,
             watchdog.events.EVENT_TYPE_MODIFIED,
+            watchdog.events.EVENT_TYPE_MOVED,
         ):
             log.info( "reloading database" )
             self.reload()
     
     def reload( self ):
+        # A single save fires several events, so only skip an unchanged
+        # database shortly after the last update; otherwise re-check torrent
+        # statuses & links, which also depend on the Transmission server
+        fingerprint = None
+        if (
+            self.reloaded is not None
+            and time.monotonic() - self.reloaded < save_event_window
+        ):
+            fingerprint = self.fingerprint
+        
         try:
-            reload_database( self.args )
+            self.fingerprint, self.cache = reload_database(
+                self.args,
+                fingerprint,
+                self.cache
+            )
         except anime_manager.database.InvalidDatabaseError as e:
             log.exception( "invalid database, please correct and re-save" )
+            self.reloaded = None
         except:
             log.exception( "an error occurred while reloading database" )
+            self.reloaded = None
+        else:
+            # Skipped events don't extend the window
+            if self.fingerprint != fingerprint:
+                self.reloaded = time.monotonic()
 
 
 def run_update( argv = sys.argv[ 1 : ] ):
@@ -154,9 +266,12 @@ def run_daemon( argv = sys.argv[ 1 : ] ):
     log.success( "starting" )
     
     observer = watchdog.observers.polling.PollingObserver()
+    # The directory is watched rather than the database file itself so the
+    # database is still picked up after being replaced rather than modified
     observer.schedule(
         AutoManageTorrentsHandler( args ),
-        args.database.parent.as_posix()
+        args.database.parent.as_posix(),
+        recursive = False
     )
     observer.start()
     
@@ -73,6 +73,15 @@ parser.add_argument(
     help     = "print changes that would be made and exit",
     required = False
 )
+parser.add_argument(
+    "-j",
+    "--jobs",
+    metavar  = "COUNT",
+    type     = int,
+    default  = 1,
+    help     = "number of threads to use for filesystem changes (default 1)",
+    required = False
+)
 parser.add_argument(
     "--no-trash",
     action   = "store_true",
@@ -5,6 +5,7 @@ import logging
 import os.path
 import pathlib
 import re
+import string
 import verboselogs
 
 import yaml
@@ -12,10 +13,15 @@ import yaml
 
 log = verboselogs.VerboseLogger( __name__ )
 
-hash_regex = r"[0-9a-fA-F]{40}"
+hash_length = 40
+hex_digits  = frozenset( string.hexdigits )
 
-# Used for flatdb normalization
-placeholder_pattern = re.compile( r"\$NAME:(" + hash_regex + r")\$" )
+# Used for flatdb normalization; the prefix & suffix are split out once so
+# placeholders can be detected with plain string comparisons
+name_placeholder = "$NAME:{hash}$"
+placeholder_prefix, _, placeholder_suffix = name_placeholder.partition(
+    "{hash}"
+)
 
 
 class InvalidDatabaseError( Exception ):
@@ -93,10 +99,7 @@ def normalize( db ):
         raise InvalidDatabaseError( "torrents list must be a dictionary" )
     
     for torrent_hash, torrent_config in db[ "torrents" ].items():
-        if not re.match(
-            r"^{}$".format( hash_regex ),
-            torrent_hash
-        ):
+        if not is_hash( torrent_hash ):
             raise InvalidDatabaseError(
                 "torrent ID {!r} is not a valid hash".format( torrent_hash )
             )
@@ -159,8 +162,7 @@ def normalize( db ):
                 # TODO: Validation & normalization
                 continue
             
-            if "episode" not in episode:
-                episode[ "episode" ] = 1
+            episode.setdefault( "episode", 1 )
             
             if "season" in episode:
                 try:
@@ -226,6 +228,101 @@ def normalize( db ):
     return db
 
 
+def is_hash( value ):
+    """Check whether a value is a valid torrent hash
+    
+    A valid hash is exactly `hash_length` hexadecimal digits, in either case.
+    
+    Args:
+        value:  The value to check
+    
+    Returns:
+        bool:   Whether `value` is a string of `hash_length` hex digits
+    """
+    
+    return (
+        isinstance( value, str )
+        and len( value ) == hash_length
+        and hex_digits.issuperset( value )
+    )
+
+
+def placeholder_hash( part ):
+    """Get the torrent hash from a torrent name placeholder
+    
+    Args:
+        part (str): A single path component
+    
+    Returns:
+        str|None:   The torrent hash if `part` is a name placeholder, otherwise
+                    None
+    """
+    
+    if not part.startswith( placeholder_prefix ):
+        return None
+    
+    start = len( placeholder_prefix )
+    end   = start + hash_length
+    hash  = part[ start : end ]
+    
+    if part.startswith( placeholder_suffix, end ) and is_hash( hash ):
+        return hash
+    else:
+        return None
+
+
+def resolve_placeholders( server, paths ):
+    """Replace torrent name placeholders in a set of paths
+    
+    The names of all torrents referenced by placeholders are looked up in a
+    single RPC.
+    
+    Args:
+        server (torrents.TransmissionServer):
+                        The Transmission server to use as a reference
+        paths (iterable[pathlib.Path]):
+                        Paths which may contain name placeholders
+    
+    Returns:
+        dict:   A map of the given paths to the paths with placeholders replaced
+    """
+    
+    # Paths without placeholders are returned as-is, so only remember which
+    # ones need resolving
+    resolved = {}
+    placeholder_paths = []
+    hashes = set()
+    
+    for path in paths:
+        # Nearly all paths contain no placeholder at all, which a substring
+        # scan rules out much faster than checking each part
+        if placeholder_prefix not in str( path ):
+            resolved[ path ] = path
+            continue
+        path_hashes = [
+            hash for hash in map( placeholder_hash, path.parts )
+            if hash is not None
+        ]
+        if path_hashes:
+            placeholder_paths.append( path )
+            hashes.update( path_hashes )
+        else:
+            resolved[ path ] = path
+    
+    names = server.torrent_names( hashes ) if hashes else {}
+    
+    def resolve_part( part ):
+        hash = placeholder_hash( part )
+        return part if hash is None else names[ hash ]
+    
+    for path in placeholder_paths:
+        resolved[ path ] = pathlib.Path( os.path.join(
+            *map( resolve_part, path.parts )
+        ) )
+    
+    return resolved
+
+
 def normalize_flatdb( server, flatdb ):
     """Normalize a flat database to the current spec
     
@@ -240,35 +337,29 @@ def normalize_flatdb( server, flatdb ):
         flatdb (dict):  A flat database to normalize in-place
     """
     
+    # Resolve placeholder filenames for all entries at once
+    resolved = resolve_placeholders( server, (
+        source
+        for entry in flatdb.values()
+        for source in entry.get( "files", {} ).values()
+    ) )
+    
+    # Relative paths between link & source directories, shared by all entries
+    link_dirs = {}
+    
     for hash, entry in flatdb.items():
         # Field "archived" added 09/03/2019 ####################################
-        if "archived" not in entry:
-            entry[ "archived" ] = False
+        entry.setdefault( "archived", False )
         
         # Placeholder paths replaced with full paths 10/12/2019 ################
-        if "files" not in entry:
-            entry[ "files" ] = {}
-        # Copy of keys iterable as we may be modifying the dictionary
-        dests = tuple( entry[ "files" ].keys() )
-        
-        for dest in dests:
-            # Look for & replace placeholder filenames
-            new_source = []
-            for part in entry[ "files" ][ dest ].parts:
-                match = placeholder_pattern.match( part )
-                if match:
-                    hash = match.group( 1 )
-                    new_source.append(
-                        server.torrent_names( ( hash, ) )[ hash ]
-                    )
-                else:
-                    new_source.append( part )
-            source = pathlib.Path( *new_source )
-            
+        # Rebuilt rather than modified in-place, as destinations may change
+        files = {}
+        for dest, source in entry.get( "files", {} ).items():
+            source = resolved[ source ]
             if dest.suffix == ".$EXTENSION$":
-                del entry[ "files" ][ dest ]
                 dest = dest.with_suffix( source.suffix )
-            entry[ "files" ][ dest ] = source
+            files[ dest ] = source
+        entry[ "files" ] = files
         
         # Torrent source history removed 10/12/2019 ############################
         if "sources" in entry:
@@ -279,18 +370,18 @@ def normalize_flatdb( server, flatdb ):
         files = {}
         for dest, source in entry[ "files" ].items():
             if dest.is_absolute() and source .is_absolute():
-                d, s = anime_manager.library.relative_link_pair( dest, source )
+                d, s = anime_manager.library.relative_link_pair(
+                    dest,
+                    source,
+                    link_dirs
+                )
                 files[ d ] = s
             else:
                 files[ dest ] = source
         entry[ "files" ] = files
         
         # Field "archived" changed to more generic "status" 01/20/2020 #########
-        if "archived" in entry:
-            archived = entry[ "archived" ]
-            del entry[ "archived" ]
-        else:
-            archived = False
+        archived = entry.pop( "archived", False )
         if "status" not in entry:
             # Set all non-stopped entries to "checking" in case they haven't
             # finished checking; they should be updated during library update
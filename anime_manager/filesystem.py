@@ -1,63 +1,129 @@
+import concurrent.futures
+import itertools
 import logging
+import os
 import pathlib
 import shutil
-import uuid
+import stat
 import verboselogs
 
 
 log = verboselogs.VerboseLogger( __name__ )
 
+# Deleted directories are removed in the background by a single worker thread
+# (see `trash_item()`); pending deletions are finished before the interpreter
+# exits
+deleter = concurrent.futures.ThreadPoolExecutor( max_workers = 1 )
+
+# Marks directories renamed out of the way for `deleter` to remove; any still
+# around once it has finished are reclaimed by `cleanup_empty_dirs()`
+deleting_marker = ".deleting-"
+
+# Source of subdirectory names that are unique within this process (see
+# `unique_name()`)
+name_counter = itertools.count()
+
+
+def unique_name():
+    """Generate a file or directory name that won't be repeated by this process
+    
+    Cheaper than a random UUID when names only need to be unique within a
+    directory this process controls.
+    
+    Returns:
+        str:    A name in the form "<pid>-<count>"
+    """
+    
+    return "{}-{}".format( os.getpid(), next( name_counter ) )
+
+
+def delete_directory( directory ):
+    """Recursively delete a directory, logging rather than raising any errors
+    
+    Args:
+        directory (pathlib.Path):   The directory to delete
+    """
+    
+    try:
+        shutil.rmtree( directory )
+    except:
+        log.exception( "failed to delete {!r}".format( directory.as_posix() ) )
+
+
+def is_pending_deletion( name ):
+    """Check whether a directory name is one given to a background deletion
+    
+    Args:
+        name (str): Name of the directory, without any parent path
+    
+    Returns:
+        bool:   Whether the directory was renamed for `deleter` to remove
+    """
+    
+    return name.startswith( "." ) and deleting_marker in name
+
+
+def wait_for_deletions():
+    """Wait for all background deletions started so far to finish"""
+    
+    # The single worker runs tasks in order, so once a no-op task submitted now
+    # has run, every earlier deletion has too
+    deleter.submit( lambda: None ).result()
+
 
 def trash_item( item, trash_directory ):
     """Move an item to the specified trash directory
     
-    Offered as a safer alternative to simply deleting
+    Offered as a safer alternative to simply deleting.  Items are placed under
+    their full original path in the trash directory, so several items can
+    share one trash directory; if an item with the same path has already been
+    trashed there, the item is placed in a new uniquely-named subdirectory
+    instead.
     
     Args:
         item (pathlib.Path):    Item (file, directory) to trash
         trash_directory (pathlib.Path|None):
                                 Trash directory; if None, item is removed
-                                instead
+                                instead (directories are renamed to a hidden
+                                name & removed in the background)
     """
     
+    announce = log.isEnabledFor( logging.INFO )
+    
     if trash_directory is None:
-        log.info( "deleting {!r}".format( item.as_posix() ) )
-        if item.is_dir():
-            shutil.rmtree( item )
+        if announce:
+            log.info( "deleting {!r}".format( item.as_posix() ) )
+        if item.is_dir() and not item.is_symlink():
+            # Renaming the directory out of the way is all that needs to happen
+            # immediately; the actual recursive delete can happen later
+            pending_path = item.with_name( ".{}{}{}".format(
+                item.name,
+                deleting_marker,
+                unique_name()
+            ) )
+            try:
+                os.rename( item, pending_path )
+            except OSError:
+                shutil.rmtree( item )
+            else:
+                deleter.submit( delete_directory, pending_path )
         else:
-            item.unlink()
+            os.unlink( item )
     else:
-        trashed_path = (
-            trash_directory
-            / str( uuid.uuid4() )
-            / (
-                pathlib.Path( *item.parts[ 1 : ] )
-                if item.is_absolute() else item
-            )
+        relative_item = (
+            pathlib.Path( *item.parts[ 1 : ] )
+            if item.is_absolute() else item
         )
-        log.info( "trashing {!r} to {!r}".format(
-            item.as_posix(),
-            trashed_path.as_posix()
-        ) )
-        trashed_path.parent.mkdir( parents = True )
-        item.rename( trashed_path )
-
-
-def ensure_not_exists( item, trash ):
-    """Ensure a path or file does not exist
-    
-    If the path or file exists, log a warning & trash it
-    
-    Args:
-        item (pathlib.Path):        Item in question
-        trash (pathlib.Path|None):  Trash directory (see
-                                    `trash_item()`)
-    """
-    if item.exists():
-        log.warning( "{!r} exists but should not, trashing".format(
-            item.as_posix()
-        ) )
-        trash_item( item, trash )
+        trashed_path = trash_directory / relative_item
+        if os.path.lexists( trashed_path ):
+            trashed_path = trash_directory / unique_name() / relative_item
+        if announce:
+            log.info( "trashing {!r} to {!r}".format(
+                item.as_posix(),
+                trashed_path.as_posix()
+            ) )
+        os.makedirs( trashed_path.parent, exist_ok = True )
+        os.rename( item, trashed_path )
 
 
 def cleanup_empty_dirs( directories, dry_run = False ):
@@ -68,30 +134,79 @@ def cleanup_empty_dirs( directories, dry_run = False ):
         dry_run (bool):     Whether to skip actually removing directories
     """
     
+    # Background deletions are finished by the time directories are scanned, so
+    # any found were left by a process that exited before finishing them or by
+    # a deletion that failed
+    def reclaim( path ):
+        ( print if dry_run else log.info )(
+            "deleting leftover directory {!r}".format( path )
+        )
+        if dry_run:
+            return False
+        delete_directory( pathlib.Path( path ) )
+        return not os.path.lexists( path )
+    
+    # Uses `os.scandir()` so directory entries' types come from the directory
+    # listing itself rather than a `stat()` per entry; symlinks (including ones
+    # to directories) are never followed & always count as contents
     def cleanup( path ):
-        if path.is_dir():
-            children = False
-            for child in path.iterdir():
-                children = not cleanup( child ) or children
-            if not children:
-                ( print if dry_run else log.verbose )(
-                    "removing empty managed directory {!r}".format(
-                        path.as_posix()
-                    )
-                )
-                if not dry_run:
-                    path.rmdir()
-                return True
-            else:
-                return False
+        empty = True
+        with os.scandir( path ) as entries:
+            for entry in entries:
+                if not entry.is_dir( follow_symlinks = False ):
+                    empty = False
+                elif is_pending_deletion( entry.name ):
+                    if not reclaim( entry.path ):
+                        empty = False
+                elif not cleanup( entry.path ):
+                    empty = False
+        if empty:
+            ( print if dry_run else log.verbose )(
+                "removing empty managed directory {!r}".format( path )
+            )
+            if not dry_run:
+                os.rmdir( path )
+        return empty
+    
+    # Let pending deletions finish first so the directories they leave empty
+    # can be removed as well, & so anything left over can be told apart from
+    # them
+    if not dry_run:
+        wait_for_deletions()
     
     for name, path in directories.items():
         if name == "media":
             continue
-        cleanup( path )
+        if path.is_dir():
+            cleanup( path.as_posix() )
 
 
-def remove_links( links, trash, dry_run = False ):
+def remove_link( link, trash ):
+    """Remove a single symlink, trashing anything else found in its place
+    
+    Args:
+        link (pathlib.Path):    Path of the symlink to remove
+        trash (pathlib.Path|None):
+                                Trash directory (see `trash_item()`)
+    """
+    
+    # Single `lstat()` for the common cases of an existing or already-removed
+    # link
+    try:
+        link_stat = os.lstat( link )
+    except FileNotFoundError:
+        return
+    if stat.S_ISLNK( link_stat.st_mode ):
+        os.unlink( link )
+    else:
+        # Something other than a link is in the way
+        log.warning( "{!r} exists but should not, trashing".format(
+            link.as_posix()
+        ) )
+        trash_item( link, trash )
+
+
+def remove_links( links, trash, dry_run = False, jobs = 1 ):
     """Execute a set of remove-symlink actions
     
     Args:
@@ -100,20 +215,69 @@ def remove_links( links, trash, dry_run = False ):
         trash (pathlib.Path|None):
                         Trash directory (see `trash_item()`)
         dry_run (bool): Whether to skip actually executing actions
+        jobs (int):     Number of threads with which to remove links
     """
     
-    for link in links:
-        ( print if dry_run else log.verbose )(
-            "removing link {!r}".format( link.as_posix() )
-        )
-        if not dry_run:
-            if link.is_symlink():
-                link.unlink()
-            else:
-                ensure_not_exists( link, trash )
+    links = list( links )
+    
+    # Skip formatting messages entirely if they won't be shown
+    announce = dry_run or log.isEnabledFor( verboselogs.VERBOSE )
+    
+    if announce:
+        for link in links:
+            ( print if dry_run else log.verbose )(
+                "removing link {!r}".format( link.as_posix() )
+            )
+    
+    if dry_run:
+        return
+    
+    if jobs > 1 and len( links ) > 1:
+        # Removals are independent of each other, and the GIL is released
+        # while waiting on the filesystem
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers = jobs
+        ) as executor:
+            futures = [
+                executor.submit( remove_link, link, trash )
+                for link in links
+            ]
+        # Re-raise the first error, if any
+        for future in futures:
+            future.result()
+    else:
+        for link in links:
+            remove_link( link, trash )
+
+
+def add_link( dest, source, trash ):
+    """Create a single symlink, replacing anything in its way
+    
+    Args:
+        dest (pathlib.Path|str):    Filename & path of the symlink
+        source (pathlib.Path|str):  Target of the symlink
+        trash (pathlib.Path|None):
+                                Trash directory (see `trash_item()`)
+    """
+    
+    # Plain `os` calls on strings, as this is run for every link
+    dest_str   = os.fspath( dest   )
+    source_str = os.fspath( source )
+    
+    # Optimistically create the link & only check the destination's parent
+    # directory or existing contents if that fails
+    try:
+        os.symlink( source_str, dest_str )
+    except FileNotFoundError:
+        os.makedirs( os.path.dirname( dest_str ), exist_ok = True )
+        os.symlink( source_str, dest_str )
+    except FileExistsError:
+        log.warning( "{!r} exists but should not, trashing".format( dest_str ) )
+        trash_item( pathlib.Path( dest ), trash )
+        os.symlink( source_str, dest_str )
 
 
-def add_links( links, trash, dry_run = False ):
+def add_links( links, trash, dry_run = False, jobs = 1 ):
     """Execute a set of add-symlink actions
     
     Args:
@@ -122,18 +286,51 @@ def add_links( links, trash, dry_run = False ):
         trash (pathlib.Path|None):
                         Trash directory (see `trash_item()`)
         dry_run (bool): Whether to skip actually executing actions
+        jobs (int):     Number of threads with which to create links
     """
     
-    for dest, source in links.items():
-        ( print if dry_run else log.verbose )(
-            "adding link {!r} -> {!r}".format(
-                dest  .as_posix(),
-                source.as_posix()
+    # Skip formatting messages entirely if they won't be shown
+    announce = dry_run or log.isEnabledFor( verboselogs.VERBOSE )
+    
+    if announce:
+        for dest, source in links.items():
+            ( print if dry_run else log.verbose )(
+                "adding link {!r} -> {!r}".format(
+                    dest  .as_posix(),
+                    source.as_posix()
+                )
             )
-        )
-        
-        if not dry_run:
-            ensure_not_exists( dest, trash )
-            dest.parent.mkdir( parents = True, exist_ok = True )
-            dest.symlink_to( source )
-
+    
+    if dry_run:
+        return
+    
+    # Group links by parent directory so a missing directory is created by
+    # the first link into it & the rest find it already there
+    by_parent = {}
+    for dest, source in links.items():
+        by_parent.setdefault(
+            os.path.dirname( os.fspath( dest ) ),
+            []
+        ).append( ( dest, source ) )
+    
+    def add_group( group ):
+        for dest, source in group:
+            add_link( dest, source, trash )
+    
+    if jobs > 1 and len( by_parent ) > 1:
+        # Directories are independent of each other, and the GIL is released
+        # while waiting on the filesystem; links within one directory are
+        # created serially so threads don't race to create it
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers = jobs
+        ) as executor:
+            futures = [
+                executor.submit( add_group, group )
+                for group in by_parent.values()
+            ]
+        # Re-raise the first error, if any
+        for future in futures:
+            future.result()
+    else:
+        for group in by_parent.values():
+            add_group( group )
@@ -6,6 +6,7 @@ import math
 import os.path
 import pathlib
 import time
+import uuid
 import verboselogs
 
 
@@ -19,12 +20,14 @@ season_quarter_map = {
 }
 
 
-def year_quarter_for_torrent( db, hash ):
+def year_quarter_for_torrent( db, hash, cache = None ):
     """Generate a standardized year-quarter subdirectory name for a torrent
     
     Args:
-        db (dict):  A full, unflattened database
-        hash (str): The torrent hash
+        db (dict):          A full, unflattened database
+        hash (str):         The torrent hash
+        cache (dict|None):  Optional map of torrent hashes to previously
+                            generated names, updated in-place
     
     Returns:
         str:    A string such as "2016q1" where the year and quarter (season)
@@ -32,43 +35,65 @@ def year_quarter_for_torrent( db, hash ):
                 episode
     """
     
-    min = "9999q9"
+    if cache is not None and hash in cache:
+        return cache[ hash ]
     
-    for episode in db[ "torrents" ][ hash ][ "episodes" ]:
-        if "pattern" in episode:
-            if "season" in episode[ "pattern" ]:
-                season = episode[ "show" ][ "seasons" ][
-                    episode[ "pattern" ][ "season" ] - 1
-                ]
+    def seasons():
+        for episode in db[ "torrents" ][ hash ][ "episodes" ]:
+            if "pattern" in episode:
+                if "season" in episode[ "pattern" ]:
+                    yield episode[ "show" ][ "seasons" ][
+                        episode[ "pattern" ][ "season" ] - 1
+                    ]
             else:
-                continue
-        else:
-            season = episode[ "show" ][ "seasons" ][ episode[ "season" ] - 1 ]
-        
-        candidate = "{}{}".format(
-            season[ "year" ],
-            season_quarter_map[ season[ "season" ] ]
-        )
-        if candidate < min:
-            min = candidate
+                yield episode[ "show" ][ "seasons" ][ episode[ "season" ] - 1 ]
+    
+    sqm = season_quarter_map
+    
+    year_quarter = min(
+        (
+            "{}{}".format( season[ "year" ], sqm[ season[ "season" ] ] )
+            for season in seasons()
+        ),
+        default = "9999q9"
+    )
     
-    return min
+    if cache is not None:
+        cache[ hash ] = year_quarter
+    
+    return year_quarter
 
 
-def show_link_for_episode( db, episode ):
+def show_link_for_episode( db, episode, cache = None ):
     """Generate an appropriate path for an episode within a season within a show
     
     Args:
-        db (dict):      A full, unflattened database
-        episode (dict): The relevant episode database entry
+        db (dict):          A full, unflattened database
+        episode (dict):     The relevant episode database entry
+        cache (dict|None):  Optional map of previously generated links, updated
+                            in-place
     
     Returns:
-        pathlib.Path:   The filename and path to which to symlink the episode
-                        (relative to the appropriate status directory), with a
-                        placehohlder extension to be replaced with the linked
-                        episode file's
+        str:    The filename and path to which to symlink the episode (relative
+                to the appropriate status directory), with a placehohlder
+                extension to be replaced with the linked episode file's
     """
     
+    if cache is not None:
+        # Values are keyed along with their types, as e.g. `1`, `1.0`, & `True`
+        # are equal but format differently
+        key = ( id( episode[ "show" ] ), ) + tuple(
+            ( type( value ), value ) for value in (
+                episode.get( "season"  ),
+                episode.get( "episode" ),
+                episode.get( "alt"     ),
+            )
+        )
+        link = cache.get( key )
+        if link is None:
+            link = cache[ key ] = show_link_for_episode( db, episode )
+        return link
+    
     extension_placeholder = "$EXTENSION$"
     
     show = episode[ "show" ]
@@ -78,25 +103,25 @@ def show_link_for_episode( db, episode ):
     has_season_title = "title" in season
     season_title = season[ "title" ] if has_season_title else show[ "title" ]
     
-    link = pathlib.Path( show[ "title" ] )
+    link = [ show[ "title" ] ]
     
     if "alt" in episode:
-        link = link / episode[ "alt" ]
+        link.append( episode[ "alt" ] )
     
     if multiseason:
         padding = int( math.log10( len( show[ "seasons" ] ) ) ) + 1
         if "title" in season:
-            link = link / "{:0{}} - {}".format(
+            link.append( "{:0{}} - {}".format(
                 episode[ "season" ],
                 padding,
                 season [ "title"  ]
-            )
+            ) )
         else:
-            link = link / "{:0{}} - Season {}".format(
+            link.append( "{:0{}} - Season {}".format(
                 episode[ "season" ],
                 padding,
                 episode[ "season" ]
-            )
+            ) )
     
     if "episode" in episode:
         episode_number = episode[ "episode" ]
@@ -114,67 +139,76 @@ def show_link_for_episode( db, episode ):
         and episode_number == 1
     ):
         if multiseason and not has_season_title:
-            link = link / "{} - s{}.{}".format(
+            link.append( "{} - s{}.{}".format(
                 show[ "title" ],
                 episode[ "season" ],
                 extension_placeholder
-            )
+            ) )
         else:
-            link = link / "{}.{}".format(
+            link.append( "{}.{}".format(
                 season_title,
                 extension_placeholder
-            )
+            ) )
     else:
         use_e = multiseason and not has_season_title
-        try:
-            padding = (
-                int( math.log10( season[ "episodes" ] ) )
-                if "episodes" in season else 1
-            ) + 1
-            try:
-                episode_string = "{:0{}d}".format( episode_number, padding )
-            except ValueError:
-                episode_string = "{:f}".format( episode_number )
-                whole, decimal = episode_string.strip( "0" ).split(
-                    ".",
-                    maxsplit = 1
-                )
-                episode_string = "{:0{}}.{}".format(
-                    int( whole ),
-                    padding,
-                    decimal if decimal else 0
-                )
-            if use_e:
-                episode_string = "e" + episode_string
-        except ValueError:
+        
+        if "episodes" not in season:
+            padding = 2
+        elif season[ "episodes" ] > 0:
+            padding = int( math.log10( season[ "episodes" ] ) ) + 1
+        else:
+            # Can't pad to a non-positive episode count
+            padding = None
+        
+        if padding is not None and isinstance( episode_number, int ):
+            episode_string = "{:0{}d}".format( episode_number, padding )
+        elif (
+            padding is not None
+            and isinstance( episode_number, float )
+            and math.isfinite( episode_number )
+            # Fractional episodes before 1 (e.g. 0.5) are left unpadded
+            and not 0 <= episode_number < 1
+        ):
+            whole, decimal = "{:f}".format( episode_number ).split( "." )
+            episode_string = "{:0{}}.{}".format(
+                int( whole ),
+                padding,
+                decimal.rstrip( "0" ) or "0"
+            )
+        else:
+            episode_string = None
+        
+        if episode_string is None:
             episode_string = str( episode_number )
             episode_string = "{}{}".format(
                 "e" if use_e and episode_string[ 0 ] in "0123456789" else " ",
                 episode_string
             )
+        elif use_e:
+            episode_string = "e" + episode_string
         
         if multiseason and not has_season_title:
-            link = link / "{} - s{}{}.{}".format(
+            link.append( "{} - s{}{}.{}".format(
                 show[ "title" ],
                 episode[ "season" ],
                 episode_string,
                 extension_placeholder
-            )
+            ) )
         else:
-            link = link / "{} - {}.{}".format(
+            link.append( "{} - {}.{}".format(
                 season_title,
                 episode_string.strip(),
                 extension_placeholder
-            )
+            ) )
     
-    return link
+    return os.path.join( *link )
 
 
 def filter_path_for_smb( path ):
     """Sanitize a path for exposing to SMB (Samba) network shares
     
     Args:
-        path (pathlib.Path):    The path to sanitize
+        path (pathlib.Path|str):    The path to sanitize
     
     Returns:
         pathlib.Path:   The sanitized path
@@ -182,7 +216,7 @@ def filter_path_for_smb( path ):
     
     filtered_path = pathlib.Path()
     
-    for part in path.parts:
+    for part in pathlib.PurePath( path ).parts:
         if part == "/":
             filtered_path /= part
         else:
@@ -204,23 +238,50 @@ def filter_path_for_smb( path ):
     return filtered_path
 
 
-def relative_link_pair( dest, source ):
+def relative_link_pair( dest, source, cache = None ):
     """Modify a source & destination so that the source is relative, if possible
     
     Args:
-        dest (pathlib.Path):    The filename & path of the symlink (fully
-                                prefixed up to the media directory)
-        source (pathlib.Path):  The target of the symlink, as cached (fully
-                                prefixed up to the media directory)
+        dest (pathlib.Path|str):    The filename & path of the symlink (fully
+                                    prefixed up to the media directory)
+        source (pathlib.Path|str):  The target of the symlink, as cached (fully
+                                    prefixed up to the media directory)
+        cache (dict|None):          Optional map of previously computed relative
+                                    directories, updated in-place
     
     Returns:
-        tuple:  The potentially modified source & destination
+        tuple:  The potentially modified source & destination as
+                `pathlib.Path`s
     """
     
-    common_path = pathlib.Path( os.path.commonpath( ( source, dest ) ) )
-    if common_path != common_path.root:
-        source = pathlib.Path( os.path.relpath( source, dest.parent ) )
-    return dest, source
+    dest   = os.fspath( dest   )
+    source = os.fspath( source )
+    
+    source_dir, source_name = os.path.split( source )
+    dest_dir = os.path.dirname( dest )
+    
+    # A source containing the link's own directory can't be reached by way of
+    # its parent directory, so is the one case worked out directly
+    if os.path.commonpath( ( source, dest_dir ) ) == source:
+        return pathlib.Path( dest ), pathlib.Path(
+            os.path.relpath( source, dest_dir )
+        )
+    
+    # Many links share the same pair of directories, so only work out the path
+    # from one to the other once per pair
+    key = ( source_dir, dest_dir )
+    if cache is None:
+        relative_dir = os.path.relpath( *key )
+    else:
+        relative_dir = cache.get( key )
+        if relative_dir is None:
+            relative_dir = cache[ key ] = os.path.relpath( *key )
+    
+    if relative_dir == os.curdir:
+        source = source_name
+    else:
+        source = os.path.join( relative_dir, source_name )
+    return pathlib.Path( dest ), pathlib.Path( source )
 
 
 def expand_episodes( server, db, hash, dry_run = False ):
@@ -256,36 +317,36 @@ def expand_episodes( server, db, hash, dry_run = False ):
                         raise
             
             for torrent_file in torrent_files:
-                # File without top-level name, as expected in the database
-                file = pathlib.Path( *torrent_file.parts[ 1 : ] )
+                # File without top-level name, as expected in the database; only
+                # converted back to a `pathlib.Path` if it matches, as most
+                # files in a torrent usually don't
+                file = "/".join( torrent_file.parts[ 1 : ] ) or "."
+                
+                match = pattern[ "regex" ].search( file )
+                if not match:
+                    continue
                 
                 generated = {
                     "show" : episode[ "show" ],
-                    "file" : file,
+                    "file" : pathlib.Path( file ),
                 }
                 for field in match_fields:
                     if field in pattern:
                         generated[ field ] = pattern[ field ]
                 
-                match = pattern[ "regex" ].search( file.as_posix() )
-                if not match:
-                    continue
-                
+                matches = pattern[ "matches" ]
                 for field in match_fields:
-                    if field not in pattern[ "matches" ]:
+                    field_match = matches.get( field )
+                    if field_match is None:
                         continue
                     
                     try:
-                        value = match.group(
-                            pattern[ "matches" ][ field ][ "group" ]
-                        )
+                        value = match.group( field_match[ "group" ] )
                         if field in ( "episode", "season", ):
                             try:
                                 generated[ field ] = int( value )
-                                if "offset" in pattern[ "matches" ][ field ]:
-                                    generated[ field ] -= (
-                                        pattern[ "matches" ][ field ][ "offset" ]
-                                    )
+                                if "offset" in field_match:
+                                    generated[ field ] -= field_match[ "offset" ]
                             except ValueError:
                                 generated[ field ] = value
                         else:
@@ -300,7 +361,7 @@ def expand_episodes( server, db, hash, dry_run = False ):
                         "required fields are missing, skipping"
                     ).format(
                         hash,
-                        file.as_posix(),
+                        file,
                         pattern[ "regex" ].pattern
                     ) )
                 else:
@@ -359,7 +420,7 @@ def status_for_torrent( server, hash, dry_run ):
     return "stopped"
 
 
-def update( server, cache, db, trash, dry_run = False ):
+def update( server, cache, db, trash, dry_run = False, jobs = 1 ):
     """Run a library update
     
     Args:
@@ -370,65 +431,100 @@ def update( server, cache, db, trash, dry_run = False ):
         trash (pathlib.Path|None):
                             Trash directory (see `filesystem.trash_item()`)
         dry_run (bool):     Whether to skip actually executing actions
+        jobs (int):         Number of threads to use for filesystem actions
     """
     
     # Reverse lookup table for status of a show
-    stati = {}
-    for status, shows in db[ "shows" ].items():
-        for show in shows:
-            stati[ show[ "title" ] ] = status
+    stati = {
+        show[ "title" ] : status
+        for status, shows in db[ "shows" ].items()
+        for show in shows
+    }
+    
+    # Everything trashed during this update shares a single trash subdirectory
+    if trash is not None:
+        trash = trash / str( uuid.uuid4() )
+    
+    directories = db[ "directories" ]
+    torrents    = db[ "torrents"    ]
+    
+    # Remove all torrents no longer in the database at once; the key view
+    # difference is a new set, so it's safe to modify the cache afterwards
+    remove_hashes = cache.keys() - torrents.keys()
+    
+    anime_manager.filesystem.remove_links(
+        [ link for hash in remove_hashes for link in cache[ hash ][ "files" ] ],
+        trash,
+        dry_run,
+        jobs
+    )
+    server.remove_torrents( remove_hashes, trash, dry_run )
     
-    remove_hashes = set( cache )
     for hash in remove_hashes:
-        if hash not in db[ "torrents" ]:
-            anime_manager.filesystem.remove_links(
-                cache[ hash ][ "files" ],
-                trash,
-                dry_run
-            )
-            cache[ hash ][ "files" ] = {}
-            
-            server.remove_torrents( ( hash, ), trash, dry_run )
-            del cache[ hash ]
-    
-    for hash in db[ "torrents" ]:
-        location = (
-            db[ "torrents" ][ hash ][ "location" ]
-            if "location" in db[ "torrents" ][ hash ]
-            else pathlib.Path()
-        )
+        del cache[ hash ]
+    
+    # Year-quarter subdirectory names by torrent hash
+    year_quarters = {}
+    
+    # Episode links by show, season, episode, & alt
+    show_links = {}
+    
+    # Relative paths between link & source directories
+    link_dirs = {}
+    
+    # Torrent actions are accumulated & executed in batches after all torrents
+    # have been checked
+    to_add    = []
+    to_move   = []
+    to_source = []
+    to_status = []
+    
+    # Cache changes recording those actions, only applied once each batch has
+    # succeeded so a failed action is retried on the next update
+    new_entries = {}
+    new_stati   = {}
+    
+    # Hashes of torrents whose links need to be checked
+    need_names = []
+    
+    torrents_dir = directories[ "torrents" ]
+    
+    for hash, torrent in torrents.items():
+        entry = cache.get( hash )
+        
+        location = torrent.get( "location", pathlib.Path() )
         if not location.is_absolute():
             location = (
-                db[ "directories" ][ "torrents" ]
-                / year_quarter_for_torrent( db, hash )
+                torrents_dir
+                / year_quarter_for_torrent( db, hash, year_quarters )
                 / location
             )
         
-        source = db[ "torrents" ][ hash ][ "source"   ]
+        source = torrent[ "source" ]
         
-        if hash not in cache:
+        if entry is None:
             torrent_status = "checking"
             torrent_status_prev = None
-        elif "archived" in db[ "torrents" ][ hash ]:
+        elif "archived" in torrent:
             # Always respect override in database
             torrent_status = {
                 True  : "stopped",
                 False : "started",
-            }[ db[ "torrents" ][ hash ][ "archived" ] ]
-            torrent_status_prev = cache[ hash ][ "status" ]
+            }[ torrent[ "archived" ] ]
+            torrent_status_prev = entry[ "status" ]
         else:
             torrent_status = status_for_torrent( server, hash, dry_run )
-            torrent_status_prev = cache[ hash ][ "status" ]
+            torrent_status_prev = entry[ "status" ]
         
         check_links = "checking" in ( torrent_status, torrent_status_prev )
         
-        if hash not in cache:
-            server.add_torrents( ( {
+        if entry is None:
+            to_add.append( {
                 "source"   : source,
                 "location" : location,
                 "started"  : torrent_status != "stopped",
-            }, ), trash, dry_run )
-            cache[ hash ] = {
+            } )
+            new_entries[ hash ] = {
                 "source"   : source,
                 "location" : location,
                 "status"   : torrent_status,
@@ -436,107 +532,166 @@ def update( server, cache, db, trash, dry_run = False ):
             }
         
         else:
-            if location != cache[ hash ][ "location" ]:
-                server.move_torrents( ( {
+            if location != entry[ "location" ]:
+                to_move.append( {
                     "hash"     : hash,
                     "location" : location,
-                }, ), trash, dry_run )
-                cache[ hash ][ "location" ] = location
+                } )
                 check_links = True
             
-            if source != cache[ hash ][ "source" ]:
-                server.source_torrents( ( {
+            if source != entry[ "source" ]:
+                to_source.append( {
                     "hash"   : hash,
                     "source" : source,
-                }, ), trash, dry_run )
-                cache[ hash ][ "source" ] = source
+                } )
             
-            if torrent_status != cache[ hash ][ "status" ]:
+            if torrent_status != entry[ "status" ]:
                 ( print if dry_run else log.info )(
                     "changing torrent {} status from {} to {}".format(
                         hash,
-                        cache[ hash ][ "status" ],
+                        entry[ "status" ],
                         torrent_status
                     )
                 )
                 
-                started       = torrent_status            != "stopped"
-                cache_started = cache[ hash ][ "status" ] != "stopped"
+                started       = torrent_status    != "stopped"
+                cache_started = entry[ "status" ] != "stopped"
                 
                 if started != cache_started:
-                    server.status_torrents( ( {
+                    to_status.append( {
                         "hash"    : hash,
                         "started" : started,
-                    }, ), trash, dry_run )
+                    } )
                 
-                cache[ hash ][ "status" ] = torrent_status
+                new_stati[ hash ] = torrent_status
         
         # if check_links:
         if True:
-            try:
-                name = server.torrent_names( ( hash, ) )[ hash ]
-            except anime_manager.torrents.RPCError:
-                if dry_run:
-                    # Generate placeholder for dry run
-                    name = "$TORRENT:{}$".format( hash )
-                else:
-                    raise
-            
-            files = {}
+            need_names.append( hash )
+    
+    server.add_torrents( to_add, trash, dry_run )
+    cache.update( new_entries )
+    
+    server.move_torrents( to_move, trash, dry_run )
+    for torrent in to_move:
+        cache[ torrent[ "hash" ] ][ "location" ] = torrent[ "location" ]
+    
+    server.source_torrents( to_source, trash, dry_run )
+    for torrent in to_source:
+        cache[ torrent[ "hash" ] ][ "source" ] = torrent[ "source" ]
+    
+    server.status_torrents( to_status, trash, dry_run )
+    for hash, torrent_status in new_stati.items():
+        cache[ hash ][ "status" ] = torrent_status
+    
+    # Torrents with episode patterns also need their file lists, which are
+    # fetched along with their names
+    need_files = [
+        hash for hash in need_names
+        if any(
+            "pattern" in episode for episode in torrents[ hash ][ "episodes" ]
+        )
+    ]
+    
+    # Look up the names (& files) of all torrents needing link checks in as
+    # few RPCs as possible rather than one per torrent
+    try:
+        if need_files:
+            server.torrent_files( need_files )
+        names = server.torrent_names( need_names ) if need_names else {}
+    except anime_manager.torrents.RPCError:
+        if dry_run:
+            # Torrents that would have been added won't exist yet, so look them
+            # up individually & generate placeholders for those
+            names = {}
+            for hash in need_names:
+                try:
+                    names[ hash ] = server.torrent_names( ( hash, ) )[ hash ]
+                except anime_manager.torrents.RPCError:
+                    names[ hash ] = "$TORRENT:{}$".format( hash )
+        else:
+            raise
+    
+    for hash in need_names:
+        entry        = cache[ hash ]
+        cached_files = entry[ "files" ]
+        torrent_dir  = os.path.join( entry[ "location" ], names[ hash ] )
+        files        = {}
+        
+        # Group episodes by show so per-show directories are only looked up &
+        # joined once
+        show_episodes = {}
+        for episode in expand_episodes( server, db, hash, dry_run ):
+            show_episodes.setdefault(
+                episode[ "show" ][ "title" ],
+                []
+            ).append( episode )
+        
+        for title, episodes in show_episodes.items():
+            status_dir = os.fspath( directories[ stati[ title ] ] )
+            smb_dir    = os.path.join( status_dir, " For SMB Shares" )
             
-            for episode in expand_episodes( server, db, hash, dry_run ):
-                status = stati[ episode[ "show" ][ "title" ] ]
-                if "file" in episode:
-                    file = episode[ "file" ]
-                else:
-                    file = pathlib.Path()
+            for episode in episodes:
+                # Paths are built as strings & only converted to
+                # `pathlib.Path`s once complete, as the latter is comparatively
+                # slow
+                raw_source = torrent_dir
+                # A file of "." is the torrent itself (single-file torrents),
+                # which `pathlib` would have normalized away
+                file = episode.get( "file" )
+                if file is not None and os.fspath( file ) != os.curdir:
+                    raw_source = os.path.join( raw_source, file )
+                extension = os.path.splitext( raw_source )[ 1 ]
+                show_link = show_link_for_episode( db, episode, show_links )
                 
-                raw_source = cache[ hash ][ "location" ] / name / file
-                dest   = (
-                    db[ "directories" ][ status ]
-                    / show_link_for_episode( db, episode )
+                dest = os.path.join( status_dir, show_link )
                 # Replace placeholder suffix with source's
-                ).with_suffix( raw_source.suffix )
+                dest = os.path.splitext( dest )[ 0 ] + extension
                 
-                dest, source = relative_link_pair( dest, raw_source )
+                dest, source = relative_link_pair(
+                    dest,
+                    raw_source,
+                    link_dirs
+                )
                 files[ dest ] = source
                 
                 # Workaround for SMB shares
-                smb_dest = (
-                    db[ "directories" ][ status ]
-                    / " For SMB Shares"
-                    / filter_path_for_smb(
-                        show_link_for_episode( db, episode )
-                    )
-                ).with_suffix( raw_source.suffix )
+                smb_dest = os.path.join(
+                    smb_dir,
+                    filter_path_for_smb( show_link )
+                )
+                smb_dest = os.path.splitext( smb_dest )[ 0 ] + extension
                 smb_dest, smb_source = relative_link_pair(
                     smb_dest,
-                    raw_source
+                    raw_source,
+                    link_dirs
                 )
                 files[ smb_dest ] = smb_source
-            
-            # Updating/creating links could be achieved by simply wiping out the
-            # old ones & replacing, but I'd rather not potentially recreate a
-            # whole bunch of links that are still correct
-            
-            links_remove = set( cache[ hash ][ "files" ] ) - set( files )
-            links_add    = {}
-            
-            for dest, source in files.items():
-                if dest not in cache[ hash ][ "files" ]:
-                    links_add[ dest ] = source
-                elif cache[ hash ][ "files" ][ dest ] != source:
-                    links_remove.add( dest )
-                    links_add[ dest ] = source
-            
-            anime_manager.filesystem.remove_links(
-                links_remove,
-                trash,
-                dry_run
-            )
-            for link in links_remove:
-                del cache[ hash ][ "files" ][ link ]
-            
-            anime_manager.filesystem.add_links( links_add, trash, dry_run )
-            for dest, source in links_add.items():
-                cache[ hash ][ "files" ][ dest ] = source
+        
+        # Updating/creating links could be achieved by simply wiping out the old
+        # ones & replacing, but I'd rather not potentially recreate a whole
+        # bunch of links that are still correct
+        
+        links_remove = cached_files.keys() - files.keys()
+        links_add    = {}
+        
+        for dest, source in files.items():
+            cached_source = cached_files.get( dest )
+            if cached_source is None:
+                links_add[ dest ] = source
+            elif cached_source != source:
+                links_remove.add( dest )
+                links_add[ dest ] = source
+        
+        anime_manager.filesystem.remove_links(
+            links_remove,
+            trash,
+            dry_run,
+            jobs
+        )
+        for link in links_remove:
+            del cached_files[ link ]
+        
+        anime_manager.filesystem.add_links( links_add, trash, dry_run, jobs )
+        for dest, source in links_add.items():
+            cached_files[ dest ] = source
@@ -1,6 +1,7 @@
 import anime_manager.database
 import anime_manager.filesystem
 
+import concurrent.futures
 import json
 import logging
 import os.path
@@ -8,12 +9,26 @@ import pathlib
 import verboselogs
 
 import requests
+import requests.adapters
+
+try:
+    # Optional, but much faster for large `torrent-get` responses
+    import orjson
+except ImportError:
+    orjson = None
 
 
 log = verboselogs.VerboseLogger( __name__ )
 
 sid_header = "X-Transmission-Session-Id"
 
+# Maximum number of simultaneous connections to a Transmission server
+rpc_connections = 4
+
+# Map of server locations to their `requests.Session`s, so connections &
+# session IDs are kept across `TransmissionServer` objects for the same server
+sessions = {}
+
 
 class RPCError( Exception ):
     def __init__( self, server, result, message ):
@@ -24,54 +39,103 @@ class RPCError( Exception ):
         )
 
 
-def filter_paths_for_json( val ):
-    """Recursively scan a structure for `pathlib.Paths`s and stringify them
-    
-    Calls `pathlib.Path.as_posix()` on each appropriate object.
-    
-    Args:
-        val (any):  The structure to filter
+class RPCEncoder( json.JSONEncoder ):
+    """JSON encoder for RPC arguments that also handles paths & sets
     
-    Returns:
-        A copy of the same structure with `pathlib.Paths`s replaced by `str`s
+    `pathlib.PurePath`s are encoded as `pathlib.PurePath.as_posix()` strings
+    and sets as lists; only these objects are converted, while the rest of the
+    structure is encoded as-is.
     """
     
-    try:
-        return val.as_posix()
-    except AttributeError:
-        if (
-               issubclass( type( val ), list )
-            or issubclass( type( val ), tuple )
-        ):
-            return type( val )( filter_paths_for_json( v ) for v in val )
-        elif issubclass( type( val ), set ):
-            return list( filter_paths_for_json( v ) for v in val )
-        elif issubclass( type( val ), dict ):
-            return type( val )( (
-                filter_paths_for_json( k ),
-                filter_paths_for_json( v )
-            ) for k, v in val.items() )
+    def default( self, o ):
+        if isinstance( o, pathlib.PurePath ):
+            return o.as_posix()
+        elif isinstance( o, ( set, frozenset ) ):
+            return list( o )
         else:
-            return val
+            return json.JSONEncoder.default( self, o )
 
 
 class TransmissionServer( object ):
     """Represents a single connection to a transmission server/daemon"""
     
-    def __init__( self, location ):
+    def __init__( self, location, session_id_file = None ):
+        """
+        Args:
+            location (str): Address & optional port of the Transmission server
+            session_id_file (pathlib.Path|None):
+                            File in which to remember the server's session ID
+                            between runs, saving a rejected first RPC
+        """
+        
         self.location = location
-        self.session  = requests.Session()
+        self.session_id_file = session_id_file
+        
+        self.session = sessions.get( location )
+        if self.session is None:
+            self.session = sessions[ location ] = requests.Session()
+            self.session.headers.update( {
+                "Connection"   : "keep-alive",
+                "Content-Type" : "application/json",
+            } )
+            if session_id_file is not None:
+                try:
+                    with open( session_id_file, encoding = "utf8" ) as sid_file:
+                        self.session.headers[ sid_header ] = (
+                            sid_file.read().strip()
+                        )
+                except IOError:
+                    pass
+            # All RPCs go to the same server, so keep a single pool of
+            # persistent connections for it
+            self.session.mount( "http://", requests.adapters.HTTPAdapter(
+                pool_connections = 1,
+                pool_maxsize     = rpc_connections,
+            ) )
+        
         self.log      = verboselogs.VerboseLogger( "{}.{}".format(
             self.__class__.__module__,
             self.__class__.__name__
         ) )
+        # Maps of torrent hashes to names & file lists (see `torrent_names()`
+        # & `torrent_files()`)
+        self.name_cache  = {}
+        self.files_cache = {}
+    
+    def set_session_id( self, session_id ):
+        """Use a new Transmission session ID, remembering it if configured to
+        
+        Args:
+            session_id (str):   Session ID sent by the server
+        """
+        
+        self.session.headers[ sid_header ] = session_id
+        
+        if self.session_id_file is not None:
+            # Written to a temporary file first so a concurrent run never
+            # reads a partial ID
+            temp_file = self.session_id_file.with_name(
+                "{}.{}".format(
+                    self.session_id_file.name,
+                    anime_manager.filesystem.unique_name()
+                )
+            )
+            try:
+                with open( temp_file, "w", encoding = "utf8" ) as sid_file:
+                    sid_file.write( session_id )
+                os.replace( temp_file, self.session_id_file )
+            except OSError:
+                self.log.warning( "failed to save session ID to {!r}".format(
+                    self.session_id_file.as_posix()
+                ) )
     
     def rpc( self, method, arguments ):
         """Perform a Transmission RPC
         
         Args:
             method (str):       Transmission RPC method name
-            arguments (str):    Arguments to pass in the RPC
+            arguments (dict):   Arguments to pass in the RPC (see
+                                `RPCEncoder`)
         
         Returns:
             The contents of the "arguments" field in the response, parsed from
@@ -86,35 +150,46 @@ class TransmissionServer( object ):
         
         message = {
             "method"    : method,
-            "arguments" : filter_paths_for_json( arguments ),
+            "arguments" : arguments,
         }
         
-        self.log.debug( "performing RPC to {}: {}".format(
-            self.location,
-            json.dumps( message, indent = 2 )
-        ) )
+        # Pretty-printing large payloads is expensive, so only do so if it
+        # will actually be logged
+        debug = self.log.isEnabledFor( logging.DEBUG )
+        
+        if debug:
+            self.log.debug( "performing RPC to {}: {}".format(
+                self.location,
+                json.dumps( message, indent = 2, cls = RPCEncoder )
+            ) )
+        
+        # Serialized once, as the request will need to be sent again if the
+        # session ID has expired
+        payload = json.dumps( message, cls = RPCEncoder ).encode( "utf8" )
         
         def do_rpc( url, data, retry = False ):
-            response = self.session.post( url, data = json.dumps( data ) )
+            response = self.session.post( url, data = data )
             if response.status_code == 409:
                 if retry:
                     response.raise_for_status()
                 else:
-                    self.session.headers.update( {
-                        sid_header : response.headers[ sid_header ]
-                    } )
+                    self.set_session_id( response.headers[ sid_header ] )
                     return do_rpc( url, data, True )
-            return response.json()
+            if orjson is None:
+                return response.json()
+            else:
+                return orjson.loads( response.content )
         
         response_content = do_rpc(
             "http://{}/transmission/rpc".format( self.location ),
-            message
+            payload
         )
         
-        self.log.debug( "RPC to {} got response: {}".format(
-            self.location,
-            json.dumps( response_content, indent = 2 )
-        ) )
+        if debug:
+            self.log.debug( "RPC to {} got response: {}".format(
+                self.location,
+                json.dumps( response_content, indent = 2 )
+            ) )
         
         if response_content[ "result" ] != "success":
             raise RPCError(
@@ -176,33 +251,40 @@ class TransmissionServer( object ):
             dry_run (bool): Whether to skip actually executing actions
         """
         
-        torrents = tuple( torrents )
+        hashes = list( torrents )
+        if not hashes:
+            return
         
-        for hash in torrents:
+        for hash in hashes:
             ( print if dry_run else self.log.verbose )(
                 "removing torrent {}".format( hash )
             )
         
-        if not dry_run and torrents:
-            locations = self.rpc(
-                "torrent-get",
-                {
-                    "ids"    : torrents,
-                    "fields" : ( "downloadDir", "name", ),
-                }
-            )[ "torrents" ]
-            for location in locations:
-                anime_manager.filesystem.trash_item(
-                    pathlib.Path( location[ "downloadDir" ] ) / location[ "name" ],
-                    trash
-                )
-            self.rpc(
-                "torrent-remove",
-                {
-                    "ids" : torrents,
-                    "delete-local-data" : False,
-                }
+        if dry_run:
+            return
+        
+        locations = self.rpc(
+            "torrent-get",
+            {
+                "ids"    : hashes,
+                "fields" : ( "downloadDir", "name", ),
+            }
+        )[ "torrents" ]
+        for location in locations:
+            anime_manager.filesystem.trash_item(
+                pathlib.Path( location[ "downloadDir" ] ) / location[ "name" ],
+                trash
             )
+        self.rpc(
+            "torrent-remove",
+            {
+                "ids" : hashes,
+                "delete-local-data" : False,
+            }
+        )
+        for hash in hashes:
+            self.name_cache .pop( hash, None )
+            self.files_cache.pop( hash, None )
     
     def source_torrents( self, torrents, trash, dry_run = False ):
         """Execute a set of re-source-torrent actions
@@ -245,20 +327,24 @@ class TransmissionServer( object ):
             dry_run (bool): Whether to skip actually executing actions
         """
         
+        # Transmission can only move torrents to one location per RPC, so group
+        # torrents by destination & move each group at once
+        locations = {}
+        
         for torrent in torrents:
+            location = torrent[ "location" ].as_posix()
             ( print if dry_run  else self.log.verbose )(
-                "moving torrent {} to {!r}".format(
-                    torrent[ "hash" ],
-                    torrent[ "location" ].as_posix()
-                )
+                "moving torrent {} to {!r}".format( torrent[ "hash" ], location )
             )
-            
-            if not dry_run:
+            locations.setdefault( location, [] ).append( torrent[ "hash" ] )
+        
+        if not dry_run:
+            for location, hashes in locations.items():
                 self.rpc(
                     "torrent-set-location",
                     {
-                        "ids"      : ( torrent[ "hash" ], ),
-                        "location" : torrent[ "location" ].as_posix(),
+                        "ids"      : hashes,
+                        "location" : location,
                         "move"     : True,
                     }
                 )
@@ -278,44 +364,55 @@ class TransmissionServer( object ):
             dry_run (bool): Whether to skip actually executing actions
         """
         
-        torrents = tuple( torrents )
-        to_stop  = set()
-        to_start = set()
+        # Map of hashes to whether they should be started; later requests
+        # override earlier ones
+        started = {}
         
         for torrent in torrents:
+            hash  = torrent[ "hash"    ]
             start = torrent[ "started" ]
             
             ( print if dry_run else self.log.verbose )(
                 "setting torrent {} to {}".format(
-                    torrent[ "hash" ],
+                    hash,
                     "started" if start else "stopped"
                 )
             )
             
-            # Sorry about this
-            add_to, other = (
-                ( to_start, to_stop ) if start
-                else ( to_stop, to_start ) 
-            )
-            if torrent[ "hash" ] in other:
+            if started.get( hash, start ) != start:
                 self.log.warning( "previous request to {} torrent {}, {}".format(
                     "stop" if start else "start",
                     hash,
                     "starting" if start else "stopping"
                 ) )
-                other.remove( torrent[ "hash" ] )
-            add_to.add( torrent[ "hash" ] )
-        
-        if not dry_run and to_stop:
-            self.rpc(
-                "torrent-stop",
-                { "ids" : to_stop, }
-            )
-        if not dry_run and to_start:
-            self.rpc(
-                "torrent-start",
-                { "ids" : to_start, }
-            )
+            started[ hash ] = start
+        
+        to_stop  = [ hash for hash, start in started.items() if not start ]
+        to_start = [ hash for hash, start in started.items() if     start ]
+        
+        if dry_run:
+            return
+        
+        rpcs = []
+        if to_stop:
+            rpcs.append( ( "torrent-stop" , { "ids" : to_stop , } ) )
+        if to_start:
+            rpcs.append( ( "torrent-start", { "ids" : to_start, } ) )
+        
+        if len( rpcs ) > 1:
+            # The two RPCs are independent, so overlap their round trips
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers = len( rpcs )
+            ) as executor:
+                futures = [
+                    executor.submit( self.rpc, method, arguments )
+                    for method, arguments in rpcs
+                ]
+            for future in futures:
+                future.result()
+        else:
+            for method, arguments in rpcs:
+                self.rpc( method, arguments )
     
     def add_torrents( self, torrents, trash, dry_run = False ):
         """Execute a set of add-torrent actions
@@ -332,22 +429,47 @@ class TransmissionServer( object ):
             dry_run (bool): Whether to skip actually executing actions
         """
         
-        for torrent in torrents:
+        # Converted once, as each location is used for both the announcement
+        # & the RPC
+        torrents = [
+            ( torrent[ "source" ], torrent[ "location" ].as_posix() )
+            for torrent in torrents
+        ]
+        
+        for source, location in torrents:
             ( print if dry_run else self.log.verbose )(
-                "adding torrent to {!r} from {}".format(
-                    torrent[ "location" ].as_posix(),
-                    torrent[ "source" ]
-                )
+                "adding torrent to {!r} from {}".format( location, source )
             )
-            
-            if not dry_run:
-                self.rpc(
-                    "torrent-add",
-                    {
-                        "filename"     : torrent[ "source" ],
-                        "download-dir" : torrent[ "location" ].as_posix(),
-                    }
-                )
+        
+        if dry_run:
+            return
+        
+        def add_torrent( torrent ):
+            source, location = torrent
+            self.rpc(
+                "torrent-add",
+                {
+                    "filename"     : source,
+                    "download-dir" : location,
+                }
+            )
+        
+        if len( torrents ) > 1:
+            # Transmission only adds one torrent per RPC, so overlap their
+            # round trips over the session's pooled connections instead
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers = rpc_connections
+            ) as executor:
+                futures = [
+                    executor.submit( add_torrent, torrent )
+                    for torrent in torrents
+                ]
+            # Re-raise the first error, if any
+            for future in futures:
+                future.result()
+        else:
+            for torrent in torrents:
+                add_torrent( torrent )
     
     def torrent_names( self, torrents ):
         """Get the names of the specified torrents
@@ -359,10 +481,20 @@ class TransmissionServer( object ):
             dict:   A map of the specified torrent hashes to their name
         """
         
-        return dict( ( key, val[ "name" ] ) for key, val in self.mapped_rpc(
-            torrents,
-            ( "name", )
-        ).items() )
+        torrents = tuple( torrents )
+        
+        # Names are cached for the lifetime of this server object, so only
+        # look up ones that haven't been seen yet
+        missing = set( torrents ) - self.name_cache.keys()
+        if missing:
+            self.name_cache.update( {
+                key : val[ "name" ] for key, val in self.mapped_rpc(
+                    missing,
+                    ( "name", )
+                ).items()
+            } )
+        
+        return { hash : self.name_cache[ hash ] for hash in torrents }
     
     def torrent_files( self, torrents ):
         """Get the names of files included in the specified torrents
@@ -375,12 +507,22 @@ class TransmissionServer( object ):
                     as `pathlib.Path`s
         """
         
-        return dict( ( key, [
-            pathlib.Path( f[ "name" ] ) for f in val[ "files" ]
-        ] ) for key, val in self.mapped_rpc(
-            torrents,
-            ( "files", )
-        ).items() )
+        torrents = tuple( torrents )
+        
+        # The name comes along for free, so fill in both caches with a single
+        # RPC for any torrents that haven't been seen yet
+        missing = set( torrents ) - self.files_cache.keys()
+        if missing:
+            for key, val in self.mapped_rpc(
+                missing,
+                ( "name", "files", )
+            ).items():
+                self.name_cache [ key ] = val[ "name" ]
+                self.files_cache[ key ] = [
+                    pathlib.Path( f[ "name" ] ) for f in val[ "files" ]
+                ]
+        
+        return { hash : self.files_cache[ hash ] for hash in torrents }
     
     def torrent_stats( self, torrents ):
         """Get various statistics of the specified torrents
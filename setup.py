@@ -26,5 +26,10 @@ setuptools.setup(
         "PyYAML>=5.1.2,<5.2",
         "requests>=2.22,<3",
         "verboselogs>=1.7",
-    ]
+    ],
+    extras_require = {
+        "fast" : [
+            "orjson>=3",
+        ],
+    }
 )